@@ -1,13 +1,25 @@
 import time
+import asyncio
 import random
 import threading
+import os
+import socket
+import queue
 import logging
-from typing import List, Dict, Any
+import collections
+import contextlib
+import itertools
+from datetime import datetime
+from typing import Optional, Tuple
 from abc import ABC, abstractmethod
-import mysql.connector
-from flask import Flask, request, jsonify
+import numpy as np
+import orjson
+from mysql.connector.pooling import MySQLConnectionPool
+from flask import Flask, Response, request
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
 import requests
-from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,185 +28,603 @@ class Service(ABC):
     def __init__(self, service_id: str, cost: float):
         self.service_id = service_id
         self.cost = cost
-        self.load = 0
+
+        # Once the service joins a fleet, its load lives in that fleet's `loads` array instead of on the object.
+        self._load = 0
+        self._stats = None
+        self._slot = 0
+        self._load_lock = threading.Lock()  # load += 1 isn't atomic
 
     @abstractmethod
     def process_request(self, request):
         pass
 
+    @property
+    def load(self) -> int:
+        if self._stats is None:
+            return self._load
+        return int(self._stats.loads[self._slot])
+
+    @load.setter
+    def load(self, value: int):
+        if self._stats is None:
+            self._load = value
+        else:
+            self._stats.loads[self._slot] = value
+
     def get_load(self) -> int:
         return self.load
 
+    def increment_load(self):
+        with self._load_lock:
+            self.load += 1
+
+class FleetStats:
+    """Structure-of-arrays view of the fleet: every service owns one slot in a flat `loads` array, so a scaling tick is one vectorised sum instead of a walk over service objects.
+    Fleet size and cost only change on register/release, so they're kept as running totals."""
+    def __init__(self, capacity: int = 64):
+        self.loads = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.total_cost = 0.0
+        self._free_slots = list(range(capacity - 1, -1, -1))
+        self._services = {}  # slot -> service
+
+    def register(self, service: Service):
+        if not self._free_slots:
+            self._grow()
+        slot = self._free_slots.pop()
+        with service._load_lock:
+            self.loads[slot] = service.load
+            service._stats, service._slot = self, slot
+        self._services[slot] = service
+        self.size += 1
+        self.total_cost += service.cost
+
+    def release(self, service: Service):
+        slot = service._slot
+        with service._load_lock:
+            service._load = int(self.loads[slot])
+            service._stats = None
+        del self._services[slot]
+        self.loads[slot] = 0
+        self._free_slots.append(slot)
+        self.size -= 1
+        self.total_cost -= service.cost
+
+    def _grow(self):
+        # Hold every service's load lock so no increment lands in the old array after it's been copied.
+        capacity = len(self.loads)
+        with contextlib.ExitStack() as stack:
+            for service in self._services.values():
+                stack.enter_context(service._load_lock)
+            self.loads = np.concatenate([self.loads, np.zeros(capacity, dtype=np.int64)])
+        self._free_slots.extend(range(2 * capacity - 1, capacity - 1, -1))
+
 class WebServer(Service):
     """ A web service that we are going to scale horizontally. """
-    def __init__(self, service_id: str, port: int, cost: float = 10):
-        super().__init__(service_id, cost)
+    def __init__(self, service_id: str, port: int, cost: float = 10, loopback: bool = False,
+                 workers: int = 1, max_workers: int = os.cpu_count() or 1, worker_cost: float = 2):
+        super().__init__(service_id, cost + (workers - 1) * worker_cost)
         self.app = Flask(__name__)
         self.port = port
+        self.loopback = loopback  # go through our own HTTP endpoint, like an external client would
+
+        # Every worker is its own Hypercorn server bound to the same port with SO_REUSEPORT, and the kernel spreads
+        # incoming connections across them. Adding one is much cheaper than bringing up a whole new WebServer.
+        self.workers = workers
+        self.max_workers = max_workers
+        self.worker_cost = worker_cost
+        self._running = []  # (event loop, shutdown event) per started worker
+        self._running_lock = threading.Lock()
+        self._closed = False  # a worker that only comes up after close() shuts itself down
+        self._url = f"http://localhost:{port}/process"
+        self._headers = {"Content-Type": "application/json"}
+
+        # Keep-alive connections are reused across requests instead of paying a TCP handshake every time.
+        self._session = requests.Session()
+        self._session.mount("http://", HTTPAdapter(pool_connections=50, pool_maxsize=100))
 
         @self.app.route('/process', methods=['POST'])
         def process():
-            data = request.json
-            result = f"Processed by WebServer {self.service_id}: {data['request']}"
-            self.load += 1
-            return jsonify({"result": result})
+            try:
+                data = orjson.loads(request.get_data())
+            except orjson.JSONDecodeError:
+                return Response(orjson.dumps({"error": "invalid JSON"}), status=400, mimetype="application/json")
+            return Response(orjson.dumps({"result": self._handle(data['request'])}), mimetype="application/json")
 
     def start(self):
-        threading.Thread(target=self.app.run, kwargs={'host': '0.0.0.0', 'port': self.port}, daemon=True).start()
+        for _ in range(self.workers):
+            self._start_worker()
+
+    def add_worker(self):
+        self.workers += 1
+        self.cost += self.worker_cost
+        self._start_worker()
+
+    def _start_worker(self):
+        threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True).start()
+
+    async def _serve(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if hasattr(socket, "SO_REUSEPORT"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(("0.0.0.0", self.port))
+
+        # Hypercorn instead of Flask's single-threaded dev server, with HTTP/1.1 keep-alive so pooled clients can hold on to their sockets.
+        config = Config()
+        config.bind = [f"fd://{sock.detach()}"]
+        config.keep_alive_timeout = 30
+        stopped = asyncio.Event()
+        with self._running_lock:
+            if self._closed:
+                stopped.set()
+            else:
+                self._running.append((asyncio.get_running_loop(), stopped))
+        # Signal handlers can only be installed from the main thread, so shutdown comes from close() instead.
+        await serve(self.app, config, mode="wsgi", shutdown_trigger=stopped.wait)
 
     def process_request(self, request):
         """ Bottleneck operation, so we scale horizontally based on the response from this function. """
-        response = requests.post(f"http://localhost:{self.port}/process", json={"request": request})
-        return response.json()['result']
+        # Requests from inside the process skip the HTTP round-trip to ourselves; the Flask app is there for external clients.
+        if self.loopback:
+            response = self._session.post(self._url, data=orjson.dumps({"request": request}), headers=self._headers)
+            return orjson.loads(response.content)['result']
+        return self._handle(request)
 
-class Database(Service):
-    """ A database service that we are going to scale horizontally. """
-    def __init__(self, service_id: str, host: str, user: str, password: str, database: str, cost: float = 20):
-        super().__init__(service_id, cost)
-        self.connection = mysql.connector.connect(
-            host=host,
-            user=user,
-            password=password,
-            database=database
-        )
-        self.cursor = self.connection.cursor()
+    def _handle(self, request_data):
+        self.increment_load()
+        return f"Processed by WebServer {self.service_id}: {request_data}"
+
+    def close(self):
+        self._session.close()
+        with self._running_lock:
+            self._closed = True
+            running, self._running = self._running, []
+        for loop, stopped in running:
+            loop.call_soon_threadsafe(stopped.set)
+
+# One MySQL connection pool shared by every Database. Adding a database to the fleet borrows an already-open
+# connection from here instead of paying a fresh TCP + auth handshake.
+_DB_POOL: Optional[MySQLConnectionPool] = None
+
+def configure_database_pool(host: str, user: str, password: str, database: str, pool_size: int = 32):
+    """Opens the shared pool (sized for the fleet's peak number of flushers) and makes sure the table exists."""
+    global _DB_POOL
+    _DB_POOL = MySQLConnectionPool(
+        pool_name="dynamo",
+        pool_size=pool_size,
+        host=host,
+        user=user,
+        password=password,
+        database=database
+    )
 
-        # Just a random table to test whether things work or not.
-        self.cursor.execute("""
+    # Just a random table to test whether things work or not.
+    connection = _DB_POOL.get_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
             CREATE TABLE IF NOT EXISTS requests (
                 id INT AUTO_INCREMENT PRIMARY KEY,
+                service_id VARCHAR(64),
                 request_data TEXT,
                 timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
-        self.connection.commit()
+        # Tables created before service_id existed don't get it from CREATE TABLE IF NOT EXISTS.
+        cursor.execute("""
+            SELECT 1 FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'requests' AND COLUMN_NAME = 'service_id'
+        """)
+        if not cursor.fetchall():
+            cursor.execute("ALTER TABLE requests ADD COLUMN service_id VARCHAR(64) AFTER id")
+        connection.commit()
+        cursor.close()
+    finally:
+        connection.close()  # hands it back to the pool
 
-    def process_request(self, request)
-        """For database operations, this is the bottleneck, so we scale horizontally based on the response from this function. """
-        # Write request to the newly created database
-        self.cursor.execute("INSERT INTO requests (request_data) VALUES (%s)", (str(request),))
-        self.connection.commit()
+class Database(Service):
+    """ A database service that we are going to scale horizontally. """
+    def __init__(self, service_id: str, cost: float = 20, flushers: int = 1,
+                 batch_size: int = 100, returning: bool = False):
+        super().__init__(service_id, cost)
+        if _DB_POOL is None:
+            raise RuntimeError("configure_database_pool() has to be called before creating a Database")
+        self.batch_size = batch_size  # max rows per INSERT
+        self.returning = returning  # MariaDB 10.5+ can hand the inserted rows back from the INSERT itself
+
+        # Pending (request_data, reply queue) pairs. The flushers write them out as multi-row INSERTs, one commit per batch,
+        # tagged with our service_id since every Database writes to the same table. A flusher starts as soon as there's
+        # anything to write; the batches form from whatever queues up while the previous INSERT and commit are in flight.
+        # Each flusher holds one connection from the shared pool until close(), so up to `flushers` batches are in flight at once.
+        # The connections are taken here so an exhausted pool fails the scale-up instead of a background thread.
+        self._buffer = collections.deque()
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+        self._flusher_lock = threading.Lock()
+        self._live_flushers = flushers
+        connections = []
+        try:
+            for _ in range(flushers):
+                connections.append(_DB_POOL.get_connection())
+        except Exception:
+            for connection in connections:
+                connection.close()  # don't strand the ones we did get
+            raise
+        for connection in connections:
+            threading.Thread(target=self._run_flusher, args=(connection,), daemon=True).start()
 
-        # Read from the created database
-        self.cursor.execute("SELECT * FROM requests ORDER BY id DESC LIMIT 1")
-        result = self.cursor.fetchone()
+    def process_request(self, request):
+        """For database operations, this is the bottleneck, so we scale horizontally based on the response from this function. """
+        # Queue the write and wait for the batch it lands in to be committed.
+        if self._closed.is_set():
+            raise RuntimeError(f"{self.service_id} is closed")
+        reply = queue.SimpleQueue()
+        self._buffer.append((str(request), reply))
+        if self._closed.is_set():
+            # close() raced us; if the flushers are already gone, nobody else will answer.
+            self._fail_leftovers()
+        elif not self._wakeup.is_set():
+            self._wakeup.set()
+        ok, result = reply.get()
+        if not ok:
+            raise result
 
-        self.load += 1
+        self.increment_load()
         return f"Database query processed by {self.service_id}: {result}"
 
+    def close(self):
+        self._closed.set()
+        self._wakeup.set()
+
+    def _run_flusher(self, connection):
+        insert_cursors = {}
+        try:
+            while not self._closed.is_set():
+                self._wakeup.wait()
+                self._wakeup.clear()
+                while self._buffer:
+                    self._flush(connection, insert_cursors)
+            # Whatever was queued before close() still gets written.
+            while self._buffer:
+                self._flush(connection, insert_cursors)
+        finally:
+            for cursor, _ in insert_cursors.values():
+                cursor.close()
+            connection.close()  # hands it back to the pool
+            with self._flusher_lock:
+                self._live_flushers -= 1
+            self._fail_leftovers()
+
+    def _fail_leftovers(self):
+        """Once the last flusher has exited, answer anything still queued with an error instead of leaving it hanging."""
+        with self._flusher_lock:
+            if self._live_flushers:
+                return
+            while self._buffer:
+                _, reply = self._buffer.popleft()
+                reply.put((False, RuntimeError(f"{self.service_id} closed before the write was flushed")))
+
+    def _flush(self, connection, insert_cursors):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._buffer.popleft())
+            except IndexError:  # another flusher drained it first
+                break
+        if not batch:
+            return
+
+        try:
+            cursor, sql = self._insert_cursor(connection, insert_cursors, len(batch))
+            cursor.execute(sql, tuple(value for data, _ in batch for value in (self.service_id, data)))
+            rows = cursor.fetchall() if self.returning else None
+            connection.commit()
+        except Exception as e:
+            for _, reply in batch:
+                reply.put((False, e))
+            return
+
+        if rows is not None:
+            for (_, reply), row in zip(batch, rows):
+                reply.put((True, tuple(row)))
+            return
+
+        # A multi-row INSERT reports the id of its first row, and the rest follow consecutively.
+        # The timestamp is taken client-side so we don't need a second round-trip to read the row back.
+        first_id = cursor.lastrowid
+        timestamp = datetime.now()
+        for offset, (data, reply) in enumerate(batch):
+            reply.put((True, (first_id + offset, data, timestamp)))
+
+    def _insert_cursor(self, connection, insert_cursors, rows: int):
+        """Server-side prepared INSERT for a batch of `rows` rows, prepared once per connection and reused afterwards."""
+        if rows not in insert_cursors:
+            # The prepared cursor only skips re-preparing when it's handed the very same SQL object, so keep it around.
+            sql = "INSERT INTO requests (service_id, request_data) VALUES " + ",".join(["(%s, %s)"] * rows)
+            if self.returning:
+                sql += " RETURNING id, request_data, timestamp"
+            insert_cursors[rows] = (connection.cursor(prepared=True), sql)
+        return insert_cursors[rows]
+
 class LoadBalancer:
     """A simple implementation of a load balancer. Static balancing as of now, but we'll  see how to do the dynamic one as well."""
     def __init__(self, services):
-        self.services = services
-        self.last_service_index = -1
+        # Read-copy-update: dispatchers only ever read an immutable tuple, and the autoscaler swaps in a new one
+        # with a single reference assignment instead of mutating a list they might be indexing.
+        self._round_robin = itertools.count()  # atomic tickets, no shared index to race on
+        self.publish(services)
 
     def distribute_request(self, request):
         """ Given any request, we allocate/distribute it to a particular service to process."""
-        if not self.services:
+        services, mask = self._ring  # one snapshot per request
+        if not services:
             raise Exception("No services available")
 
-        self.last_service_index = (self.last_service_index + 1) % len(self.services)
-        service = self.services[self.last_service_index]
+        ticket = next(self._round_robin)
+        service = services[ticket & mask if mask is not None else ticket % len(services)]
         return service.process_request(request)
 
+    def publish(self, services):
+        services = tuple(services)
+        size = len(services)
+        mask = size - 1 if size and size & (size - 1) == 0 else None  # power-of-two pools can mask instead of `%`
+        self.services = services
+        self._ring = (services, mask)
+
+def _decide_scaling(avg_load: float, available_budget: float, web_servers: int, databases: int,
+                    scale_up_threshold: float, scale_down_threshold: float, coin: float,
+                    can_remove_web_server: bool = True) -> Optional[str]:
+    """The numeric core of a scaling tick, kept free of side effects: returns which action to take (or None), and the
+    caller does the actual provisioning. `coin` is a uniform draw in [0, 1) that picks between the two options, and
+    `can_remove_web_server` is False when the forecast still needs every web server we have."""
+    if avg_load > scale_up_threshold and available_budget > 0:
+        if available_budget >= 20 and coin < 0.3:  # Does this number makes sense?
+            return "add_database"
+        if available_budget >= 10:
+            return "add_web_server"
+    elif avg_load < scale_down_threshold and (web_servers > 1 or databases > 1):
+        if web_servers and can_remove_web_server and (databases <= 1 or coin < 0.7):  # 70% chance to remove a web server
+            return "remove_web_server"
+        if databases > 1:
+            return "remove_database"
+    return None
+
 class BudgetConstrainedAutoScaler:
     """A budget based autoscaler to simulate real-life scenarios. """
-    def __init__(self, web_servers: List[WebServer], databases: List[Database], 
+    def __init__(self, web_lb: LoadBalancer, db_lb: LoadBalancer,
                  total_budget: float, 
                  web_server_factory: callable, database_factory: callable,
-                 scale_up_threshold: int = 10, scale_down_threshold: int = 5):
-        self.web_servers = web_servers
-        self.databases = databases
+                 scale_up_threshold: int = 10, scale_down_threshold: int = 5,
+                 per_worker_capacity: float = 10, forecast_window: int = 10, forecast_headroom: float = 1.2):
+        self.web_lb = web_lb
+        self.db_lb = db_lb
         self.total_budget = total_budget
         self.web_server_factory = web_server_factory
         self.database_factory = database_factory
         self.scale_up_threshold = scale_up_threshold
         self.scale_down_threshold = scale_down_threshold
 
+        # Predictive scaling: requests/second a single web server worker can take, and how much recent traffic to look at.
+        self.per_worker_capacity = per_worker_capacity
+        self.forecast_window = forecast_window
+        self.forecast_headroom = forecast_headroom
+        self._arrival_rates = collections.deque(maxlen=60)  # requests per second, newest last
+        self._rng = random.Random()  # our own generator rather than the module-level one every thread shares
+
+        self.stats = FleetStats()
+        # Services taken out of the fleet on the previous tick. Dispatchers may still hold a snapshot that includes
+        # them, so they're only closed a tick later, once any dispatch that picked them is long finished.
+        self._retired = []
+        for service in self.web_servers + self.databases:
+            self.stats.register(service)
+
+    @property
+    def web_servers(self) -> Tuple[WebServer, ...]:
+        return self.web_lb.services
+
+    @property
+    def databases(self) -> Tuple[Database, ...]:
+        return self.db_lb.services
+
+    def record_arrivals(self, requests_per_second: int):
+        self._arrival_rates.append(requests_per_second)
+
+    def check_forecast(self):
+        """Scale ahead of demand rather than after it. A new web server takes a while to come up, so if the recent peak
+        arrival rate (plus some headroom) already outruns the fleet, we add one now instead of waiting for load to pile up."""
+        forecast = self._forecast()
+        if forecast is None:
+            return
+
+        capacity = self._web_capacity(self.web_servers)
+        available_budget = self.total_budget - self.stats.total_cost
+        if forecast > capacity:
+            logger.info("Forecast of %.1f req/s exceeds capacity of %.1f req/s.", forecast, capacity)
+            self._add_web_capacity(available_budget)
+
+    def _forecast(self) -> Optional[float]:
+        if not self._arrival_rates:
+            return None
+        recent = itertools.islice(reversed(self._arrival_rates), self.forecast_window)
+        return self.forecast_headroom * max(recent)
+
+    def _web_capacity(self, servers) -> float:
+        # Extra Hypercorn workers only add capacity when requests actually go over HTTP.
+        return sum(server.workers if server.loopback else 1 for server in servers) * self.per_worker_capacity
+
+    def _add_web_capacity(self, available_budget: float):
+        """Two-tier scale up: another worker on a running server is cheap and near-instant, so try that first and only
+        pay for a whole new web server once every existing one is at its worker limit. Only loopback servers take workers,
+        the rest are dispatched to in-process and never see their HTTP workers."""
+        for server in self.web_servers:
+            if server.loopback and server.workers < server.max_workers and server.worker_cost <= available_budget:
+                server.add_worker()
+                self.stats.total_cost += server.worker_cost
+                logger.info("Scaling up. Web server %s now has %d workers.", server.service_id, server.workers)
+                return
+        if available_budget >= 10:
+            self._add_web_server(available_budget)
+
+    def _add_web_server(self, available_budget: float):
+        new_server = self.web_server_factory()
+        if new_server.cost <= available_budget:
+            self.stats.register(new_server)
+            new_server.start()
+            self.web_lb.publish(self.web_servers + (new_server,))
+            logger.info("Scaling up. New web server added: %s", new_server.service_id)
+
     def check_and_scale(self):
         """This is the event loop function. We'll call this repetedly and check whether the resources are suffic or not."""
-      
-        total_load = sum(server.get_load() for server in self.web_servers) + sum(db.get_load() for db in self.databases)
-        avg_load = total_load / (len(self.web_servers) + len(self.databases)) if (self.web_servers or self.databases) else 0
+        for service in self._retired:
+            service.close()
+        self._retired = []
 
-        current_cost = sum(server.cost for server in self.web_servers) + sum(db.cost for db in self.databases)
+        total_load = self.stats.loads.sum()
+        avg_load = total_load / self.stats.size if self.stats.size else 0
+
+        current_cost = self.stats.total_cost
         available_budget = self.total_budget - current_cost
 
-        if avg_load > self.scale_up_threshold and available_budget > 0:
-            if available_budget >= 20 and random.random() < 0.3:  # Does this number makes sense?
+        # The reactive path is only the fallback, so it mustn't take away a web server the forecast would just add back.
+        forecast = self._forecast()
+        can_remove_web_server = forecast is None or forecast <= self._web_capacity(self.web_servers[:-1])
+        action = _decide_scaling(avg_load, available_budget, len(self.web_servers), len(self.databases),
+                                 self.scale_up_threshold, self.scale_down_threshold, self._rng.random(),
+                                 can_remove_web_server)
+
+        if action == "add_database":
+            try:
                 new_db = self.database_factory()
+            except Exception as e:  # e.g. PoolError once the shared pool runs dry
+                logger.warning("Scaling up failed, couldn't add a database: %s", e)
+            else:
                 if new_db.cost <= available_budget:
-                    self.databases.append(new_db)
-                    logger.info(f"Scaling up. New database added: {new_db.service_id}")
-            elif available_budget >= 10:
-                new_server = self.web_server_factory()
-                if new_server.cost <= available_budget:
-                    self.web_servers.append(new_server)
-                    new_server.start()
-                    logger.info(f"Scaling up. New web server added: {new_server.service_id}")
-        elif avg_load < self.scale_down_threshold and (len(self.web_servers) > 1 or len(self.databases) > 1):
-            if self.web_servers and (len(self.databases) <= 1 or random.random() < 0.7):  # 70% chance to remove a web server
-                removed_server = self.web_servers.pop()
-                logger.info(f"Scaling down. Web server removed: {removed_server.service_id}")
-            elif self.databases:
-                removed_db = self.databases.pop()
-                logger.info(f"Scaling down. Database removed: {removed_db.service_id}")
-
-        logger.info(f"Current setup: {len(self.web_servers)} web servers, {len(self.databases)} databases. " 
-                    f"Avg load: {avg_load:.2f}, Available budget: {available_budget:.2f}")
+                    self.stats.register(new_db)
+                    self.db_lb.publish(self.databases + (new_db,))
+                    logger.info("Scaling up. New database added: %s", new_db.service_id)
+                else:
+                    new_db.close()  # give its pooled connections back
+        elif action == "add_web_server":
+            self._add_web_capacity(available_budget)
+        elif action == "remove_web_server":
+            removed_server = self.web_servers[-1]
+            self.web_lb.publish(self.web_servers[:-1])
+            self.stats.release(removed_server)
+            self._retired.append(removed_server)
+            logger.info("Scaling down. Web server removed: %s", removed_server.service_id)
+        elif action == "remove_database":
+            removed_db = self.databases[-1]
+            self.db_lb.publish(self.databases[:-1])
+            self.stats.release(removed_db)
+            self._retired.append(removed_db)
+            logger.info("Scaling down. Database removed: %s", removed_db.service_id)
+
+        logger.info("Current setup: %d web servers, %d databases. Avg load: %.2f, Available budget: %.2f",
+                    len(self.web_servers), len(self.databases), avg_load, available_budget)
 
 class DynamicWebTier:
     """Think of this function as the service manager, which manages the services dynamically. """
     def __init__(self, total_budget: float, initial_web_servers: int = 2, initial_databases: int = 1):
-        self.web_servers = [WebServer(f"WebServer-{i}", 5000 + i) for i in range(initial_web_servers)]
-        self.databases = [Database(f"Database-{i}", "localhost", "user", "password", "testdb") for i in range(initial_databases)]
+        web_servers = [WebServer(f"WebServer-{i}", 5000 + i) for i in range(initial_web_servers)]
+        configure_database_pool("localhost", "user", "password", "testdb")
+        databases = [Database(f"Database-{i}") for i in range(initial_databases)]
         
-        for server in self.web_servers:
+        for server in web_servers:
             server.start()
 
         # Flexible, we can use either or both. 
-        self.web_lb = LoadBalancer(self.web_servers)
-        self.db_lb = LoadBalancer(self.databases)
+        self.web_lb = LoadBalancer(web_servers)
+        self.db_lb = LoadBalancer(databases)
         
+        self._rng = random.Random()
+        # SO_REUSEPORT would let two servers that drew the same port silently share it, so every new one gets a fresh port.
+        self._ports = itertools.count(5000 + initial_web_servers)
         self.auto_scaler = BudgetConstrainedAutoScaler(
-            self.web_servers, 
-            self.databases, 
+            self.web_lb,
+            self.db_lb,
             total_budget,
-            lambda: WebServer(f"WebServer-{random.randint(1000, 9999)}", random.randint(5000, 6000)),
-            lambda: Database(f"Database-{random.randint(1000, 9999)}", "localhost", "user", "password", "testdb")
+            lambda: WebServer(f"WebServer-{self._rng.randint(1000, 9999)}", next(self._ports)),
+            lambda: Database(f"Database-{self._rng.randint(1000, 9999)}")
         )
 
+        self._arrivals = threading.Event()
         self.scaling_thread = threading.Thread(target=self._run_auto_scaler, daemon=True)
         self.scaling_thread.start()
 
+    def record_arrivals(self, requests_per_second: int):
+        """Called by the traffic source once a second; wakes the scaler so the forecast is checked straight away."""
+        self.auto_scaler.record_arrivals(requests_per_second)
+        self._arrivals.set()
+
     def _run_auto_scaler(self):
+        next_reactive_check = time.time()
         while True:
-            self.auto_scaler.check_and_scale()
-            time.sleep(5)  # Check scaling every 5 seconds ; in real scenarios, this might be different.
+            # The forecast is checked whenever new traffic comes in. The reactive check is the fallback,
+            # every 5 seconds ; in real scenarios, this might be different.
+            self._arrivals.wait(timeout=max(0, next_reactive_check - time.time()))
+            if self._arrivals.is_set():
+                self._arrivals.clear()
+                self.auto_scaler.check_forecast()
+            if time.time() >= next_reactive_check:
+                self.auto_scaler.check_and_scale()
+                next_reactive_check = time.time() + 5
 
     def process_request(self, request):
         web_response = self.web_lb.distribute_request(request)
         db_response = self.db_lb.distribute_request(request)
         return f"{web_response} -> {db_response}"
 
-def simulate_traffic(web_tier: DynamicWebTier, duration: int, max_requests_per_second: int):
+def _traffic_worker(web_tier: DynamicWebTier, inbox: queue.SimpleQueue):
+    while True:
+        item = inbox.get()
+        if item is None:
+            return
+        request, reply = item
+        try:
+            reply.put((True, web_tier.process_request(request)))
+        except Exception as e:
+            reply.put((False, e))
+
+def simulate_traffic(web_tier: DynamicWebTier, duration: int, max_requests_per_second: int, workers: int = 0):
     """ Instead of actual traffic, we simulate traffic through this proxy function. """
     start_time = time.time()
     request_count = 0
+    rng = random.Random()
 
-    with ThreadPoolExecutor(max_workers=100) as executor:
+    # Every worker drains its own queue and requests are striped across them, so there's no single task queue
+    # for all producers and consumers to fight over. A power-of-two worker count lets the stripe be a mask.
+    workers = workers or os.cpu_count() or 1
+    workers = 1 << (workers - 1).bit_length()
+    mask = workers - 1
+    inboxes = [queue.SimpleQueue() for _ in range(workers)]
+    threads = [threading.Thread(target=_traffic_worker, args=(web_tier, inbox), daemon=True) for inbox in inboxes]
+    for thread in threads:
+        thread.start()
+
+    try:
         while time.time() - start_time < duration:
-            requests_this_second = random.randint(1, max_requests_per_second)
-            futures = []
+            requests_this_second = rng.randint(1, max_requests_per_second)
+            web_tier.record_arrivals(requests_this_second)
+            replies = queue.SimpleQueue()  # every worker answers this second's requests here
             for i in range(requests_this_second):
-                futures.append(executor.submit(web_tier.process_request, f"Request-{request_count}"))
+                inboxes[request_count & mask].put((f"Request-{request_count}", replies))
                 request_count += 1
-            for future in futures:
-                result = future.result()
-                logger.debug(result)
+            debug = logger.isEnabledFor(logging.DEBUG)
+            for i in range(requests_this_second):
+                ok, result = replies.get()
+                if not ok:
+                    raise result
+                if debug:
+                    logger.debug(result)
             time.sleep(1)
+    finally:
+        for inbox in inboxes:
+            inbox.put(None)
+        for thread in threads:
+            thread.join()
 
-    logger.info(f"Simulation complete. Processed {request_count} requests in {duration} seconds.")
+    logger.info("Simulation complete. Processed %d requests in %d seconds.", request_count, duration)
 
 if __name__ == "__main__":
     total_budget = 100  # Total budget for all services
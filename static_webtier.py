@@ -2,6 +2,8 @@ import time
 import random
 import threading
 import logging
+import heapq
+import itertools
 from typing import List, Callable, Dict, Any
 from abc import ABC, abstractmethod
 
@@ -12,25 +14,63 @@ class Service(ABC):
     def __init__(self, service_id: str):
         self.service_id = service_id
         self.load = 0
+        self._load_lock = threading.Lock()  # several dispatchers can bump load at once
 
     @abstractmethod
     def process_request(self, request: Any) -> Any:
         pass
 
+    def increment_load(self):
+        with self._load_lock:
+            self.load += 1
+
 class LoadBalancer:
     """A simple implementation of a load balancer. Static balancing as of now, but we'll  see how to do the dynamic one as well."""
     def __init__(self, distribution_algorithm: str = "round_robin"):
         self.services: List[Service] = []
         self.distribution_algorithm = distribution_algorithm
-        self.last_service_index = -1
+        self._round_robin = itertools.count()  # next() is atomic
+        self._ring = ((), None)  # (services, mask), rebuilt on add/remove
+
+        # Least connections keeps a min-heap of (load, tiebreak, service) instead of scanning every service per request.
+        # Removed services leave their entry behind; it's skipped when popped because its tiebreak is no longer live.
+        self._heap = []
+        self._heap_live: Dict[Service, int] = {}
+        self._tiebreak = itertools.count()
+        self._heap_lock = threading.Lock()
 
     def add_service(self, service: Service):
         self.services.append(service)
-        logger.info(f"Added service: {service.service_id}")
+        self._rebuild_ring()
+        with self._heap_lock:
+            self._push(service.load, service)
+        logger.info("Added service: %s", service.service_id)
 
     def remove_service(self, service: Service):
         self.services.remove(service)
-        logger.info(f"Removed service: {service.service_id}")
+        self._rebuild_ring()
+        with self._heap_lock:
+            self._heap_live.pop(service, None)
+        logger.info("Removed service: %s", service.service_id)
+
+    def _rebuild_ring(self):
+        services = tuple(self.services)
+        size = len(services)
+        self._ring = (services, size - 1 if size and not size & (size - 1) else None)
+
+    def _push(self, load: int, service: Service):
+        tiebreak = next(self._tiebreak)
+        self._heap_live[service] = tiebreak
+        heapq.heappush(self._heap, (load, tiebreak, service))
+
+    def _least_loaded(self) -> Service:
+        with self._heap_lock:
+            while True:
+                load, tiebreak, service = heapq.heappop(self._heap)
+                if self._heap_live.get(service) == tiebreak:
+                    break
+            self._push(load + 1, service)
+        return service
 
     def distribute_request(self, request: Any) -> Any:
         """Really important to understand this function. Given any request, we allocate/distribute it to a particular service to process."""
@@ -39,18 +79,19 @@ class LoadBalancer:
 
         # If our algo is round robin, we get the service in a circular based manner(round robin). 
         if self.distribution_algorithm == "round_robin":
-            self.last_service_index = (self.last_service_index + 1) % len(self.services)  # this is OK, but can we do a master-slave thing?
-            service = self.services[self.last_service_index]
+            services, mask = self._ring
+            ticket = next(self._round_robin)
+            service = services[ticket & mask if mask is not None else ticket % len(services)]  # this is OK, but can we do a master-slave thing?
         
         # If our algo is least connection, we get the service which has the minimun load.
         elif self.distribution_algorithm == "least_connections":
-            service = min(self.services, key=lambda s: s.load)
+            service = self._least_loaded()
         
         else:
             raise ValueError(f"Unknown distribution algorithm: {self.distribution_algorithm}")
 
         result = service.process_request(request)
-        service.load += 1 # really important to do this, otherwise we'll be stuck in a loop.
+        service.increment_load() # really important to do this, otherwise we'll be stuck in a loop.
         return result
 
 class AutoScaler:
@@ -77,12 +118,12 @@ class AutoScaler:
         if avg_load > self.scale_up_threshold and len(self.load_balancer.services) < self.max_services:
             new_service = self.service_factory()
             self.load_balancer.add_service(new_service)
-            logger.info(f"Scaling up. New service added. Total services: {len(self.load_balancer.services)}")
+            logger.info("Scaling up. New service added. Total services: %d", len(self.load_balancer.services))
         
         elif avg_load < self.scale_down_threshold and len(self.load_balancer.services) > self.min_services:
             service_to_remove = self.load_balancer.services[-1]
             self.load_balancer.remove_service(service_to_remove)
-            logger.info(f"Scaling down. Service removed. Total services: {len(self.load_balancer.services)}")
+            logger.info("Scaling down. Service removed. Total services: %d", len(self.load_balancer.services))
 
 class DynamicServiceManager:
     def __init__(self, service_factory: Callable[[], Service], 
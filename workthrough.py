@@ -14,31 +14,21 @@ class TrafficBalancer:
 
     def throw_traffic(self, num_requests: int) -> int:
         # based on the budget, handle the traffic
-        if num_requests < self.load:
-            # then one service is more than enough
-            return len(self.services) # num workers.
-        
-        total_budget = self.load # we start off with the initial service load. 
-        while num_requests > total_budget:
-            new_service = Service(self.load)
-            total_budget += self.load
-            self.services.append(new_service)
-        
-        return len(self.services)
+        # every service handles `self.load` requests, so we need ceil(num_requests / self.load) of them (at least one).
+        num_services = max(1, -(-num_requests // self.load))
+        if num_services > len(self.services):
+            self.services.extend(Service(self.load) for _ in range(num_services - len(self.services)))
+
+        return len(self.services) # num workers.
     
     def distribute_traffic(self, num_requests):
         num_services = self.throw_traffic(num_requests=num_requests) # populates the service.
         # Distribute the num_requests among num_services. Try to do it equally, if not we'll... .
-        if num_requests % num_services == 0:
-            for service in self.services:
-                service.capacity = num_requests // num_services
-        else: # not distributing equally.
-            # First, we'll get the traffic that si remanining,the closest to which we can distribute.
-            remaining =  num_requests % num_services
-            # we can give it randomly to any one of the service
-            import random 
-            r_service = random.choice(self.services)
-            r_service.capacity += remaining
+        # Whatever doesn't divide equally is spread one request each over the first `remaining` services,
+        # so no service ends up above its budget.
+        per_service, remaining = divmod(num_requests, num_services)
+        for i, service in enumerate(self.services):
+            service.capacity = per_service + 1 if i < remaining else per_service
     
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="A simple Load Balancer.")